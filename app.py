@@ -4,8 +4,10 @@ import streamlit as st
 from styles import get_custom_css
 from state_manager import initialize_session_state, reset_all_states
 # MODIFIED: Correctly importing from ui_components
-from ui_components import render_filter_panel, render_channel_analysis, render_supply_demand_analysis
-from data_processing import load_data, preprocess_data, filter_dataframe, generate_supply_demand_data
+from ui_components import render_filter_panel, render_channel_analysis, render_supply_demand_analysis, \
+    render_comparison_analysis, render_progressive_channel_analysis
+from data_processing import load_data, preprocess_data, filter_dataframe, generate_supply_demand_data, \
+    build_stratified_sample, PROGRESSIVE_MODE_MIN_ROWS
 
 st.set_page_config(layout="wide", page_title="岗位&渠道数据展示面板")
 st.markdown(get_custom_css(), unsafe_allow_html=True)
@@ -26,13 +28,20 @@ def render_main_content():
         'start_date': st.session_state.applied_start_date,
         'end_date': st.session_state.applied_end_date
     }
-    filtered_data = filter_dataframe(st.session_state.processed_df, applied_selections)
 
-    if filtered_data.empty:
-        st.info("根据已应用的筛选条件，没有找到匹配的数据。请调整筛选条件后点击“应用筛选”。")
+    if st.session_state.sample_df is not None:
+        # Large dataset: sampled preview first, exact metrics swapped in once the background job finishes.
+        render_progressive_channel_analysis(applied_selections)
     else:
-        render_channel_analysis(filtered_data)
-        render_supply_demand_analysis()
+        filtered_data = filter_dataframe(st.session_state.processed_df, applied_selections)
+
+        if filtered_data.empty:
+            st.info("根据已应用的筛选条件，没有找到匹配的数据。请调整筛选条件后点击“应用筛选”。")
+        else:
+            render_channel_analysis(filtered_data)
+            render_supply_demand_analysis()
+
+    render_comparison_analysis(st.session_state.processed_df)
 
 
 def render_file_uploader():
@@ -56,6 +65,8 @@ def render_file_uploader():
             st.session_state.processed_df = preprocess_data(main_df, bole_df)
             st.session_state.last_uploaded_filename = uploaded_file.name
             if st.session_state.processed_df is not None:
+                st.session_state.sample_df = build_stratified_sample(st.session_state.processed_df) \
+                    if len(st.session_state.processed_df) >= PROGRESSIVE_MODE_MIN_ROWS else None
                 all_job_categories = st.session_state.processed_df['职位类'].dropna().unique()
                 st.session_state.supply_demand_data = generate_supply_demand_data(all_job_categories)
             st.rerun()
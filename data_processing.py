@@ -1,5 +1,6 @@
 # data_processing.py
 
+import os
 import pandas as pd
 import numpy as np
 
@@ -123,34 +124,102 @@ def get_global_filter_options(df, ui_selections):
 # --- MODIFIED: Added back the missing function ---
 def filter_dataframe(df_processed, applied_selections):
     if df_processed is None: return pd.DataFrame()
-    filtered_df = df_processed.copy()
-    if applied_selections['bgs']: filtered_df = filtered_df[filtered_df['BG'].isin(applied_selections['bgs'])]
-    if applied_selections['job_types']: filtered_df = filtered_df[
-        filtered_df['职位类'].isin(applied_selections['job_types'])]
-    if applied_selections['job_titles']: filtered_df = filtered_df[
-        filtered_df['专业职位'].isin(applied_selections['job_titles'])]
-    if applied_selections['grades']: filtered_df = filtered_df[
-        filtered_df['职级&管理职级'].isin(applied_selections['grades'])]
-    filtered_df.dropna(subset=['入职日期'], inplace=True)
-    if not filtered_df.empty:
+    return df_processed[build_filter_mask(df_processed, applied_selections)].copy()
+
+
+def build_filter_mask(df_processed, selections):
+    """Returns a boolean Series marking the rows that match one set of filter selections."""
+    mask = pd.Series(True, index=df_processed.index)
+    if selections['bgs']: mask &= df_processed['BG'].isin(selections['bgs'])
+    if selections['job_types']: mask &= df_processed['职位类'].isin(selections['job_types'])
+    if selections['job_titles']: mask &= df_processed['专业职位'].isin(selections['job_titles'])
+    if selections['grades']: mask &= df_processed['职级&管理职级'].isin(selections['grades'])
+    mask &= df_processed['入职日期'].notna()
+    if mask.any():
         try:
-            if applied_selections['start_date']: filtered_df = filtered_df[
-                filtered_df['入职日期'] >= pd.to_datetime(applied_selections['start_date'])]
-            if applied_selections['end_date']: filtered_df = filtered_df[
-                filtered_df['入职日期'] <= pd.to_datetime(applied_selections['end_date'])]
+            date_mask = mask.copy()
+            if selections['start_date']: date_mask &= df_processed['入职日期'] >= pd.to_datetime(
+                selections['start_date'])
+            if selections['end_date']: date_mask &= df_processed['入职日期'] <= pd.to_datetime(
+                selections['end_date'])
+            mask = date_mask
         except (ValueError, TypeError):
             pass
-    return filtered_df
+    return mask
+
+
+# --- Channel classification rules, shared by all channel calculations ---
+CHANNEL_ORDER = ['媒体', '伯乐', '猎头', '人才库盘活']
+TALENT_POOL_SOURCES = ['内部人才盘活', '公司并购/投资公司或子公司转入', '外包/外聘转正']
+OWN_NETWORK_SOURCES = ['个人自有人脉', '公司外朋友推荐/候选人推荐']
+
+
+def get_channel_rule_masks(df):
+    """Returns the boolean row masks behind every channel rule, keyed by rule name."""
+    return {
+        'website': df['最后渠道1'] == '媒体',
+        'media_source': df['简历来源'].str.contains("媒体", na=False),
+        'bole': df['付费渠道_b'] == '伯乐',
+        'qlima': df['付费渠道_b'] == '千里马自主投递',
+        'lietou': df['付费渠道_b'] == '猎头',
+        'talent_pool': df['简历来源'].isin(TALENT_POOL_SOURCES),
+        'own_network': df['简历来源'].isin(OWN_NETWORK_SOURCES),
+    }
+
+
+def get_channel_flags(df):
+    """Returns per-row hire counts for each top-level channel, matching calculate_channel_metrics totals."""
+    rules = {name: mask.astype(int) for name, mask in get_channel_rule_masks(df).items()}
+    # calculate_channel_metrics counts media as len(concat([website, media]).drop_duplicates()): fully identical
+    # rows are merged within each rule, while a row matching both rules still counts once per rule.
+    first_occurrence = (~df.duplicated()).astype(int)
+    return pd.DataFrame({
+        '媒体': (rules['website'] + rules['media_source']) * first_occurrence,
+        '伯乐': rules['bole'] + rules['qlima'],
+        '猎头': rules['lietou'],
+        '人才库盘活': rules['talent_pool'] + rules['own_network'],
+    }, index=df.index)
+
+
+def calculate_comparison_metrics(df_processed, filter_sets, cancel_event=None):
+    """Computes the channel mix of several named filter sets in a single grouped pass.
+
+    Every row is tagged with the set(s) it belongs to, and the per-set channel hires
+    are obtained by one membership x channel-flag product instead of filtering and
+    recalculating once per set. Returns None if cancel_event is set before the work finishes,
+    so it can run as a background job.
+    """
+    if df_processed is None or df_processed.empty or not filter_sets: return {}
+    if cancel_event is not None and cancel_event.is_set(): return None
+    membership = pd.DataFrame({name: build_filter_mask(df_processed, selections)
+                               for name, selections in filter_sets.items()}, index=df_processed.index)
+    if cancel_event is not None and cancel_event.is_set(): return None
+    channel_flags = get_channel_flags(df_processed)
+    hires_by_set = pd.DataFrame(membership.to_numpy(dtype=int).T @ channel_flags.to_numpy(),
+                                index=membership.columns, columns=channel_flags.columns)
+
+    results = {}
+    for set_name, hires in hires_by_set.iterrows():
+        total_hires = int(hires.sum())
+        results[set_name] = {
+            "rows": int(membership[set_name].sum()),
+            "total_hires": total_hires,
+            "channels": {channel: {"hires": int(hires[channel]),
+                                   "percentage": (hires[channel] / total_hires) * 100 if total_hires else 0.0}
+                         for channel in CHANNEL_ORDER}
+        }
+    return results
 
 
 def calculate_channel_metrics(df_filtered):
     """MODIFIED: Fixed TypeError by correctly using Series methods instead of dict.pop()."""
     if df_filtered is None or df_filtered.empty: return {}
     results = {}
+    rules = get_channel_rule_masks(df_filtered)
 
     # --- Channel 1: Media ---
-    website_df = df_filtered[df_filtered['最后渠道1'] == '媒体'].copy()
-    media_df = df_filtered[df_filtered['简历来源'].str.contains("媒体", na=False)].copy()
+    website_df = df_filtered[rules['website']].copy()
+    media_df = df_filtered[rules['media_source']].copy()
     media_df['normalized_source'] = media_df['简历来源'].str.replace('/', '', regex=False).str.strip()
 
     total_media_hires = len(pd.concat([website_df, media_df]).drop_duplicates())
@@ -193,13 +262,13 @@ def calculate_channel_metrics(df_filtered):
     # (Bole, Headhunter, Talent Pool, and Final Assembly logic is the same as the last correct version)
 
     # Bole (Unchanged)
-    bole_only_df = df_filtered[df_filtered['付费渠道_b'] == '伯乐'].copy()
+    bole_only_df = df_filtered[rules['bole']].copy()
     bole_only_df['is_same_bg'] = bole_only_df.apply(
         lambda row: row['伯乐所在BG'] == row['BG'] if pd.notna(row['伯乐所在BG']) and pd.notna(row['BG']) else False,
         axis=1)
     本bg_hires = int(bole_only_df['is_same_bg'].sum())
     其他bg_hires = len(bole_only_df) - 本bg_hires
-    qlima_df = df_filtered[df_filtered['付费渠道_b'] == '千里马自主投递'].copy()
+    qlima_df = df_filtered[rules['qlima']].copy()
     qlima_hires = len(qlima_df)
     total_bole_hires = 本bg_hires + 其他bg_hires + qlima_hires
     bole_pie_data = {'labels': ['本BG', '其他BG', '千里马自主投递'], 'values': [本bg_hires, 其他bg_hires, qlima_hires]}
@@ -211,7 +280,7 @@ def calculate_channel_metrics(df_filtered):
         bole_details = ["无伯乐渠道入职"]
 
     # Headhunter (Unchanged)
-    lietou_df = df_filtered[df_filtered['付费渠道_b'] == '猎头'].copy()
+    lietou_df = df_filtered[rules['lietou']].copy()
     total_lietou_hires = len(lietou_df)
     lietou_details, lietou_pie_labels, lietou_pie_values = [], [], []
     if total_lietou_hires > 0:
@@ -233,10 +302,8 @@ def calculate_channel_metrics(df_filtered):
     lietou_pie_data = {'labels': lietou_pie_labels, 'values': lietou_pie_values}
 
     # Talent Pool (Unchanged)
-    tp_keywords = ['内部人才盘活', '公司并购/投资公司或子公司转入', '外包/外聘转正']
-    on_keywords = ['个人自有人脉', '公司外朋友推荐/候选人推荐']
-    tp_df = df_filtered[df_filtered['简历来源'].isin(tp_keywords)].copy()
-    on_df = df_filtered[df_filtered['简历来源'].isin(on_keywords)].copy()
+    tp_df = df_filtered[rules['talent_pool']].copy()
+    on_df = df_filtered[rules['own_network']].copy()
     tp_hires = len(tp_df)
     on_hires = len(on_df)
     total_tp_hires = tp_hires + on_hires
@@ -262,4 +329,69 @@ def calculate_channel_metrics(df_filtered):
                        "details_text_list": lietou_details, "pie_data": lietou_pie_data}
     results['人才库盘活'] = {"hires": total_tp_hires, "percentage": (total_tp_hires / total_hires) * 100,
                              "details_text_list": tp_details, "pie_data": tp_pie_data}
-    return results
\ No newline at end of file
+    return results
+
+
+# --- Progressive mode: stratified sample taken at ingest for fast approximate previews ---
+# An .xlsx sheet holds at most 1,048,576 rows, so the default must stay well below that to be reachable.
+PROGRESSIVE_MODE_MIN_ROWS = int(os.environ.get('HRDATAVIS_PROGRESSIVE_MIN_ROWS', 200_000))
+SAMPLE_STRATA_COLUMNS = ['BG', '职位类']
+SAMPLE_FRACTION = 0.02
+SAMPLE_MIN_PER_STRATUM = 30
+SAMPLE_WEIGHT_COLUMN = '_sample_weight'
+
+
+def build_stratified_sample(df_processed, frac=SAMPLE_FRACTION, min_per_stratum=SAMPLE_MIN_PER_STRATUM,
+                            random_state=0):
+    """Draws a sample stratified by BG/职位类, keeping at least min_per_stratum rows (or the whole
+    stratum if smaller). Each sampled row carries its inverse sampling rate in SAMPLE_WEIGHT_COLUMN."""
+    if df_processed is None or df_processed.empty: return None
+    rng = np.random.default_rng(random_state)
+    shuffled = df_processed.iloc[rng.permutation(len(df_processed))]
+    strata = shuffled.groupby(SAMPLE_STRATA_COLUMNS, dropna=False, sort=False)
+    stratum_size = strata[SAMPLE_STRATA_COLUMNS[0]].transform('size')
+    target = np.minimum(stratum_size, np.maximum(np.ceil(stratum_size * frac), min_per_stratum))
+    keep = strata.cumcount() < target
+    sample_df = shuffled[keep].copy()
+    sample_df[SAMPLE_WEIGHT_COLUMN] = (stratum_size / target)[keep]
+    return sample_df.sort_index()
+
+
+def estimate_channel_percentages(sample_filtered, z=1.96):
+    """Estimates the channel percentages from a filtered stratified sample.
+
+    Uses the same channel rules as calculate_channel_metrics, weighting every hire by its
+    sampling weight. Confidence intervals are Wilson score intervals on Kish's effective sample
+    size over the sampled hires, so channels with few or no sampled hires still get a non-zero
+    upper bound.
+    """
+    if sample_filtered is None or sample_filtered.empty: return {}
+    channel_flags = get_channel_flags(sample_filtered)
+    weights = sample_filtered[SAMPLE_WEIGHT_COLUMN]
+    weighted_hires = channel_flags.mul(weights, axis=0).sum()
+    total_weighted_hires = weighted_hires.sum()
+    if total_weighted_hires == 0: return {}
+    effective_n = total_weighted_hires ** 2 / (channel_flags.sum(axis=1) * weights ** 2).sum()
+    z_sq_over_n = z ** 2 / effective_n
+
+    results = {}
+    for channel in CHANNEL_ORDER:
+        share = weighted_hires[channel] / total_weighted_hires
+        center = (share + z_sq_over_n / 2) / (1 + z_sq_over_n)
+        margin = z * np.sqrt(share * (1 - share) / effective_n + z_sq_over_n / (4 * effective_n)) / (1 + z_sq_over_n)
+        results[channel] = {"sample_hires": int(channel_flags[channel].sum()),
+                            "percentage": share * 100,
+                            "ci_low": max(center - margin, 0.0) * 100,
+                            "ci_high": min(center + margin, 1.0) * 100}
+    return results
+
+
+def compute_exact_channel_metrics(df_processed, applied_selections, cancel_event=None):
+    """Filters the full data and calculates the exact channel metrics. Safe to run off the main thread.
+
+    Returns (matching row count, channel metrics), or None if cancel_event was set before the work finished.
+    """
+    if cancel_event is not None and cancel_event.is_set(): return None
+    filtered_df = filter_dataframe(df_processed, applied_selections)
+    if cancel_event is not None and cancel_event.is_set(): return None
+    return len(filtered_df), calculate_channel_metrics(filtered_df)
@@ -25,4 +25,32 @@ def create_pie_chart(labels, values, title):
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
         height=400
     )
-    return fig
\ No newline at end of file
+    return fig
+
+
+def create_grouped_bar_chart(categories, series_dict):
+    """Creates a Plotly grouped bar chart with one bar series per entry of series_dict."""
+    if not categories or not series_dict:
+        return None
+
+    fig = go.Figure()
+    colors = px.colors.qualitative.Pastel
+    for i, (series_name, values) in enumerate(series_dict.items()):
+        fig.add_trace(go.Bar(
+            x=categories,
+            y=values,
+            name=series_name,
+            marker_color=colors[i % len(colors)],
+            text=[f"{v:.1f}%" for v in values],
+            textposition='outside',
+            hovertemplate=f'{series_name}<br>%{{x}}: %{{y:.1f}}%<extra></extra>'
+        ))
+
+    fig.update_layout(
+        barmode='group',
+        margin=dict(l=20, r=20, t=30, b=20),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        yaxis_title="入职贡献率 (%)",
+        height=450
+    )
+    return fig
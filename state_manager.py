@@ -19,6 +19,14 @@ def initialize_session_state():
         # --- MODIFIED: Add states for drill-down ---
         'media_drilldown_selection': '总览',
         'talent_pool_drilldown_selection': '总览',
+        # Named filter sets for side-by-side comparison: {name: selections}
+        'comparison_sets': {},
+        'ui_comparison_set_name': '',
+        'comparison_metrics_cache': None,
+        # Progressive mode: stratified sample (None for small datasets) and the background jobs
+        'sample_df': None,
+        'exact_metrics_job': None,
+        'comparison_job': None,
     }
     for key, default_value in state_keys.items():
         if key not in st.session_state:
@@ -33,6 +41,12 @@ def reset_all_states(clear_df=True):
         st.session_state.file_uploader_key += 1
 
     st.session_state.supply_demand_data = None
+    st.session_state.sample_df = None
+    for job_slot in ['exact_metrics_job', 'comparison_job']:
+        job = st.session_state[job_slot]
+        if job is not None:
+            job['cancel_event'].set()
+        st.session_state[job_slot] = None
     filter_keys = ['bgs', 'job_types', 'job_titles', 'grades']
     for key in filter_keys:
         st.session_state[f'ui_{key}'] = []
@@ -43,4 +57,7 @@ def reset_all_states(clear_df=True):
     st.session_state.applied_end_date = None
     # --- MODIFIED: Reset drill-down states ---
     st.session_state.media_drilldown_selection = '总览'
-    st.session_state.talent_pool_drilldown_selection = '总览'
\ No newline at end of file
+    st.session_state.talent_pool_drilldown_selection = '总览'
+    st.session_state.comparison_sets = {}
+    st.session_state.ui_comparison_set_name = ''
+    st.session_state.comparison_metrics_cache = None
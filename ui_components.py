@@ -4,8 +4,14 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from data_processing import get_global_filter_options, calculate_channel_metrics
-from plotting import create_pie_chart
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from data_processing import get_global_filter_options, filter_dataframe, calculate_channel_metrics, \
+    calculate_comparison_metrics, estimate_channel_percentages, compute_exact_channel_metrics, CHANNEL_ORDER
+from plotting import create_pie_chart, create_grouped_bar_chart
+
+FILTER_KEYS = ['bgs', 'job_types', 'job_titles', 'grades', 'start_date', 'end_date']
+BACKGROUND_POLL_SECONDS = 1.0
 
 
 # --- MODIFIED: Created a specific callback for clearing dates ---
@@ -16,6 +22,33 @@ def clear_date_selection():
     # No need for st.rerun() here, on_click handles it automatically.
 
 
+def make_selections_key(selections):
+    """Returns a hashable key for one set of filter selections."""
+    return tuple((key, tuple(value) if isinstance(value, list) else value) for key, value in selections.items())
+
+
+def save_comparison_set():
+    """Callback that stores the current (not yet applied) filter selections as a named comparison set."""
+    set_name = st.session_state.ui_comparison_set_name.strip()
+    if not set_name:
+        set_index = 1
+        while f"对比组{set_index}" in st.session_state.comparison_sets:
+            set_index += 1
+        set_name = f"对比组{set_index}"
+    elif set_name in st.session_state.comparison_sets:
+        st.toast(f"对比组“{set_name}”已存在，请换一个名称或先移除原对比组。", icon="⚠️")
+        return
+    st.session_state.comparison_sets = {**st.session_state.comparison_sets,
+                                        set_name: {key: st.session_state[f'ui_{key}'] for key in FILTER_KEYS}}
+    st.session_state.ui_comparison_set_name = ''
+
+
+def remove_comparison_set(set_name):
+    """Callback that deletes one named comparison set."""
+    st.session_state.comparison_sets = {name: selections for name, selections in
+                                        st.session_state.comparison_sets.items() if name != set_name}
+
+
 def render_filter_panel():
     """Renders the entire filter panel UI and handles its state."""
     with st.expander("数据筛选条件", expanded=True):
@@ -55,21 +88,32 @@ def render_filter_panel():
         with f_col4:
             st.multiselect("职级&管理职级", options['grades'], key='ui_grades')
 
-        if st.button("应用筛选", type="primary"):
-            for key in ['bgs', 'job_types', 'job_titles', 'grades', 'start_date', 'end_date']:
-                st.session_state[f'applied_{key}'] = st.session_state[f'ui_{key}']
+        apply_col, name_col, save_col = st.columns([4, 6, 2])
+        with apply_col:
+            if st.button("应用筛选", type="primary"):
+                for key in FILTER_KEYS:
+                    st.session_state[f'applied_{key}'] = st.session_state[f'ui_{key}']
+        with name_col:
+            st.text_input("对比组名称", key='ui_comparison_set_name', placeholder="对比组名称 (可选)",
+                          label_visibility="collapsed")
+        with save_col:
+            st.button("保存为对比组", on_click=save_comparison_set)
 
 
 def render_channel_analysis(filtered_data):
     """Renders channel analysis with drill-down pie charts."""
+    render_channel_metrics(calculate_channel_metrics(filtered_data))
+
+
+def render_channel_metrics(channel_metrics):
+    """Renders already calculated channel metrics with drill-down pie charts."""
     st.markdown("<h3 class='channel-main-title'>相对渠道入职贡献率</h3>", unsafe_allow_html=True)
-    channel_metrics = calculate_channel_metrics(filtered_data)
 
     if not channel_metrics:
         st.warning("根据新规则，无法计算出任何渠道贡献率。")
         return
 
-    channel_order = ['媒体', '伯乐', '猎头', '人才库盘活']
+    channel_order = CHANNEL_ORDER
     cols = st.columns(len(channel_order))
 
     for i, channel_name in enumerate(channel_order):
@@ -123,6 +167,180 @@ def render_channel_analysis(filtered_data):
             if fig: st.plotly_chart(fig, use_container_width=True)
 
 
+@st.cache_resource
+def get_background_executor():
+    """Returns the thread pool shared by all sessions for background full-data calculations."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="background-metrics")
+
+
+def get_background_job(job_slot, job_key, job_fn, *job_args):
+    """Returns this session's job in session_state[job_slot] for job_key, starting it if needed.
+
+    A slot has at most one job in flight per session. A superseded job is asked to stop via its
+    cancel_event, and the new job is only submitted once the old one has stopped, so stale full-data
+    work never holds the shared workers ahead of the current request. A cancelled job is never reused,
+    even if job_key matches it again. Returns None while waiting.
+    """
+    job = st.session_state[job_slot]
+    if job is not None and job['key'] == job_key and not job['cancel_event'].is_set():
+        return job
+    if job is not None and not job['future'].done():
+        job['cancel_event'].set()
+        if not job['future'].cancel():
+            return None
+    cancel_event = threading.Event()
+    future = get_background_executor().submit(job_fn, *job_args, cancel_event=cancel_event)
+    job = {'key': job_key, 'future': future, 'cancel_event': cancel_event}
+    st.session_state[job_slot] = job
+    return job
+
+
+def get_background_job_result(job):
+    """Returns the result of a finished job, or None after reporting that it failed or was cancelled."""
+    if job['cancel_event'].is_set():
+        st.warning("后台计算已被取消，请重新点击“应用筛选”。")
+        return None
+    try:
+        return job['future'].result()
+    except Exception as e:
+        st.error(f"后台计算失败，请重新点击“应用筛选”或重新上传数据：{e}")
+        return None
+
+
+@st.fragment(run_every=BACKGROUND_POLL_SECONDS)
+def poll_background_job(job_slot):
+    """Reruns the app once the job in session_state[job_slot] has finished, so its result gets swapped in."""
+    job = st.session_state[job_slot]
+    if job is not None and job['future'].done():
+        st.rerun()
+
+
+def render_approximate_channel_analysis(estimates, sample_rows):
+    """Renders sampled channel percentages with confidence intervals, clearly marked as approximate."""
+    st.markdown("<h3 class='channel-main-title'>相对渠道入职贡献率（近似值）</h3>", unsafe_allow_html=True)
+    st.info(f"⏳ 以下为基于 {sample_rows} 条分层抽样数据（按BG/职位类分层）的近似结果，括号内为95%置信区间。"
+            f"精确结果正在后台计算，完成后将自动替换。")
+
+    cols = st.columns(len(CHANNEL_ORDER))
+    for i, channel_name in enumerate(CHANNEL_ORDER):
+        estimate = estimates[channel_name]
+        with cols[i]:
+            st.markdown(
+                f"<div class='channel-header-box'><h5>{channel_name}</h5><p>≈{estimate['percentage']:.1f}%</p></div>",
+                unsafe_allow_html=True)
+            style_class = "channel-detail-box-white" if i % 2 == 0 else "channel-detail-box-gray"
+            detail_html = (f"<ul><li>95%置信区间: {estimate['ci_low']:.1f}% ~ {estimate['ci_high']:.1f}%</li>"
+                           f"<li>样本入职数: {estimate['sample_hires']}</li></ul>")
+            st.markdown(f"<div class='channel-detail-box {style_class}'>{detail_html}</div>", unsafe_allow_html=True)
+
+
+def render_progressive_channel_analysis(applied_selections):
+    """Renders a sampled preview of the channel analysis, then the exact result once it is computed."""
+    job_key = (st.session_state.last_uploaded_filename, make_selections_key(applied_selections))
+    job = get_background_job('exact_metrics_job', job_key, compute_exact_channel_metrics,
+                             st.session_state.processed_df, applied_selections)
+
+    if job is not None and job['future'].done():
+        exact_result = get_background_job_result(job)
+        if exact_result is None:
+            return
+        row_count, channel_metrics = exact_result
+        if row_count == 0:
+            st.info("根据已应用的筛选条件，没有找到匹配的数据。请调整筛选条件后点击“应用筛选”。")
+            return
+        render_channel_metrics(channel_metrics)
+    else:
+        sample_filtered = filter_dataframe(st.session_state.sample_df, applied_selections)
+        estimates = estimate_channel_percentages(sample_filtered)
+        if estimates:
+            render_approximate_channel_analysis(estimates, len(sample_filtered))
+        else:
+            st.info("⏳ 抽样数据中没有匹配的渠道入职记录，精确结果正在后台计算中…")
+        poll_background_job('exact_metrics_job')
+
+    render_supply_demand_analysis()
+
+
+def describe_selections(selections):
+    """Returns a short human-readable summary of one set of filter selections."""
+    parts = []
+    for key, label in [('bgs', 'BG'), ('job_types', '职位类'), ('job_titles', '职位名称'), ('grades', '职级')]:
+        if selections[key]:
+            parts.append(f"{label}: {'、'.join(map(str, selections[key]))}")
+    if selections['start_date'] or selections['end_date']:
+        parts.append(f"日期: {selections['start_date'] or '不限'} ~ {selections['end_date'] or '不限'}")
+    return "；".join(parts) if parts else "全部数据"
+
+
+def make_comparison_key(comparison_sets):
+    """Returns a hashable key for the uploaded dataset and the current comparison sets."""
+    return (st.session_state.last_uploaded_filename,
+            tuple((name, make_selections_key(selections)) for name, selections in comparison_sets.items()))
+
+
+def get_comparison_metrics(df_processed, comparison_sets):
+    """Returns the comparison metrics, recomputed only when the dataset or the comparison sets change."""
+    cache_key = make_comparison_key(comparison_sets)
+    cache = st.session_state.comparison_metrics_cache
+    if cache is None or cache['key'] != cache_key:
+        cache = {'key': cache_key, 'metrics': calculate_comparison_metrics(df_processed, comparison_sets)}
+        st.session_state.comparison_metrics_cache = cache
+    return cache['metrics']
+
+
+def render_comparison_analysis(df_processed):
+    """Renders the side-by-side channel mix of all saved comparison sets."""
+    comparison_sets = st.session_state.comparison_sets
+    if not comparison_sets:
+        return
+
+    st.markdown("---")
+    st.markdown("<h3 class='channel-main-title' style='font-size: 22px; margin-top:15px;'>渠道对比分析</h3>",
+                unsafe_allow_html=True)
+
+    for set_name, selections in comparison_sets.items():
+        label_col, remove_col = st.columns([10, 2])
+        with label_col:
+            st.markdown(f"**{set_name}** — {describe_selections(selections)}")
+        with remove_col:
+            st.button("移除", key=f"remove_comparison_{set_name}", on_click=remove_comparison_set, args=(set_name,))
+
+    if st.session_state.sample_df is not None:
+        # Large dataset: keep the full-data pass off the script thread, like the exact channel metrics.
+        job = get_background_job('comparison_job', make_comparison_key(comparison_sets),
+                                 calculate_comparison_metrics, df_processed, comparison_sets)
+        if job is None or not job['future'].done():
+            st.info("⏳ 对比结果正在后台计算中，完成后将自动显示。")
+            poll_background_job('comparison_job')
+            return
+        comparison_metrics = get_background_job_result(job)
+        if comparison_metrics is None:
+            return
+    else:
+        comparison_metrics = get_comparison_metrics(df_processed, comparison_sets)
+    valid_sets = {name: metrics for name, metrics in comparison_metrics.items() if metrics['total_hires'] > 0}
+    empty_sets = [name for name in comparison_metrics if name not in valid_sets]
+    if empty_sets:
+        st.info(f"以下对比组没有可计算的渠道入职数据：{'、'.join(empty_sets)}")
+    if not valid_sets:
+        return
+
+    series = {name: [metrics['channels'][channel]['percentage'] for channel in CHANNEL_ORDER]
+              for name, metrics in valid_sets.items()}
+    st.markdown("<div class='pie-chart-title'>渠道入职贡献率对比</div>", unsafe_allow_html=True)
+    fig = create_grouped_bar_chart(CHANNEL_ORDER, series)
+    if fig: st.plotly_chart(fig, use_container_width=True)
+
+    pie_cols = st.columns(len(valid_sets))
+    for i, (set_name, metrics) in enumerate(valid_sets.items()):
+        with pie_cols[i]:
+            title = f"{set_name} 渠道构成"
+            st.markdown(f"<div class='pie-chart-title'>{title}</div>", unsafe_allow_html=True)
+            fig = create_pie_chart(CHANNEL_ORDER,
+                                   [metrics['channels'][channel]['hires'] for channel in CHANNEL_ORDER], title)
+            if fig: st.plotly_chart(fig, use_container_width=True, key=f"comparison_pie_{set_name}")
+
+
 def render_supply_demand_analysis():
     # This function is unchanged.
     st.markdown("---")